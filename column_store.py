@@ -0,0 +1,165 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+from schema import COLUMNS, CATEGORY_COLS, MEASURE_COLS, NATURAL_KEY, hash_keys, hash_rows, tanggal_categorical
+
+# ====================================================================
+# --- COLUMN STORE (MEMORY-MAPPED) ---
+# Salinan data per kolom dalam file .npy berukuran tetap. Kolom numerik
+# dan kode kategori dibuka dengan np.load(mmap_mode='r'), sehingga semua
+# sesi/proses Streamlit berbagi halaman memori yang sama dari page cache
+# OS dan RSS per worker tidak ikut membesar seiring bertambahnya histori.
+# CSV + journal tetap menjadi sumber kebenaran; store ini bisa dibangun
+# ulang kapan saja dari CSV.
+#
+# Setiap versi juga menyimpan hash kunci (NATURAL_KEY) dan hash isi per
+# baris, dipakai diff_versions() untuk mencari kunci yang berubah.
+# ====================================================================
+
+CURRENT_FILE = "CURRENT"
+META_FILE = "meta.json"
+KEY_HASH_FILE = "key_hash.npy"
+ROW_HASH_FILE = "row_hash.npy"
+
+# Jumlah versi yang disimpan agar diff antar versi yang berdekatan tetap bisa dihitung
+STORE_RETENTION = 5
+
+def _codes_dtype(n_categories):
+    """Lebar kode sama seperti yang dipilih pandas, agar Categorical tidak menyalin kode."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def _column_file(idx):
+    return f"col_{idx:02d}.npy"
+
+def _version_dir(store_dir, version):
+    return os.path.join(store_dir, f"v{version:08d}")
+
+def store_version(store_dir):
+    """Versi data (seq journal) yang sedang aktif di store, atau None jika belum ada."""
+    try:
+        with open(os.path.join(store_dir, CURRENT_FILE), encoding='utf-8') as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def write_store(df, store_dir, version, key_hash=None):
+    """
+    Tulis dataframe bertipe disk (Tanggal string ISO) sebagai versi baru.
+    Setiap versi ditulis ke direktori sendiri lalu CURRENT dipindah, jadi
+    pembaca yang masih memegang mmap versi lama tidak terganggu.
+    `key_hash` boleh diisi jika hash kunci per baris sudah dihitung pemanggil.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    version_dir = _version_dir(store_dir, version)
+    tmp_dir = f"{version_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    meta = {"version": version, "n_rows": len(df), "categories": {}}
+    for idx, col in enumerate(COLUMNS):
+        if col in MEASURE_COLS:
+            values = df[col].to_numpy(dtype="float64")
+        else:
+            # Tanggal dan kolom kategori disimpan sebagai kode + kamus
+            codes, uniques = pd.factorize(df[col], sort=True)
+            meta["categories"][col] = [str(v) for v in uniques]
+            values = codes.astype(_codes_dtype(len(uniques)))
+        np.save(os.path.join(tmp_dir, _column_file(idx)), values)
+
+    np.save(os.path.join(tmp_dir, KEY_HASH_FILE), hash_keys(df) if key_hash is None else key_hash)
+    np.save(os.path.join(tmp_dir, ROW_HASH_FILE), hash_rows(df))
+
+    with open(os.path.join(tmp_dir, META_FILE), "w", encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(version_dir, ignore_errors=True)
+    os.replace(tmp_dir, version_dir)
+
+    tmp_current = os.path.join(store_dir, f"{CURRENT_FILE}.tmp")
+    with open(tmp_current, "w", encoding='utf-8') as f:
+        f.write(str(version))
+    os.replace(tmp_current, os.path.join(store_dir, CURRENT_FILE))
+
+    # Hanya STORE_RETENTION versi terbaru yang disimpan; di Linux mmap yang
+    # masih terbuka ke versi yang dihapus tetap valid
+    old_versions = sorted(
+        name for name in os.listdir(store_dir)
+        if name.startswith("v") and not name.endswith(".tmp") and name != f"v{version:08d}"
+    )
+    for name in old_versions[:max(len(old_versions) - (STORE_RETENTION - 1), 0)]:
+        shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
+
+def read_store(store_dir, version=None):
+    """
+    Buka satu versi (default: versi aktif) sebagai dataframe read-only tanpa
+    menyalin data: kolom numerik berupa memmap float64, kolom kategori dan
+    Tanggal berupa Categorical di atas memmap kode (Tanggal terurut, dengan
+    kategori datetime.date).
+    """
+    if version is None:
+        version = store_version(store_dir)
+    version_dir = _version_dir(store_dir, version)
+    with open(os.path.join(version_dir, META_FILE), encoding='utf-8') as f:
+        meta = json.load(f)
+
+    # mmap tidak bisa dibuat untuk array kosong
+    mmap_mode = "r" if meta["n_rows"] > 0 else None
+
+    data = {}
+    for idx, col in enumerate(COLUMNS):
+        values = np.load(os.path.join(version_dir, _column_file(idx)), mmap_mode=mmap_mode)
+        if col in MEASURE_COLS:
+            data[col] = values
+        elif col in CATEGORY_COLS:
+            dtype = pd.CategoricalDtype(meta["categories"][col])
+            data[col] = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+        else:
+            data[col] = tanggal_categorical(values, meta["categories"][col])
+
+    return pd.DataFrame(data, copy=False)
+
+def read_hashes(store_dir, version):
+    """(key_hash, row_hash) untuk satu versi, atau None jika versi sudah tidak disimpan."""
+    version_dir = _version_dir(store_dir, version)
+    try:
+        return (np.load(os.path.join(version_dir, KEY_HASH_FILE)),
+                np.load(os.path.join(version_dir, ROW_HASH_FILE)))
+    except OSError:
+        return None
+
+def diff_versions(store_dir, old_version, new_version):
+    """
+    Kunci yang berubah dari old_version ke new_version, sebagai dataframe
+    NATURAL_KEY + kolom "Perubahan" ("tambah", "ubah", atau "hapus").
+    Mengembalikan None jika salah satu versi sudah tidak disimpan; pemanggil
+    sebaiknya menghitung ulang penuh.
+    """
+    old_hashes = read_hashes(store_dir, old_version)
+    new_hashes = read_hashes(store_dir, new_version)
+    if old_hashes is None or new_hashes is None:
+        return None
+    old_key, old_row = old_hashes
+    new_key, new_row = new_hashes
+
+    # Kunci unik per versi, jadi cukup dicocokkan lewat hash kunci
+    old_row_by_key = pd.Series(old_row, index=old_key)
+    in_old = np.isin(new_key, old_key)
+    added = ~in_old
+    changed = in_old.copy()
+    changed[in_old] = old_row_by_key.reindex(new_key[in_old]).to_numpy() != new_row[in_old]
+    removed = ~np.isin(old_key, new_key)
+
+    frames = []
+    for version, mask, label in [(new_version, added, "tambah"), (new_version, changed, "ubah"), (old_version, removed, "hapus")]:
+        if mask.any():
+            df_keys = read_store(store_dir, version)[NATURAL_KEY].iloc[np.flatnonzero(mask)]
+            frames.append(df_keys.astype({col: str for col in NATURAL_KEY[1:]}).assign(Perubahan=label))
+    if not frames:
+        return pd.DataFrame(columns=NATURAL_KEY + ["Perubahan"])
+    return pd.concat(frames, ignore_index=True)
@@ -5,10 +5,10 @@ import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np 
 
+from schema import STT_DUMMY_MESIN, BERAT_PER_PCS_KG, SHIFT_OPTIONS, LINES, DEFAULT_LINE, line_label, date_range_mask
+
 # --- KONSTANTA GLOBAL ---
-STT_DUMMY_MESIN = "STT_DUMMY_OUTPUT" 
-BERAT_PER_PCS_KG = 0.075 
-ALL_AVAILABLE_SHIFTS = ['Semua Shift', 'Shift 1', 'Shift 2', 'Shift 3', 'Shift Tidak Tercatat'] 
+ALL_AVAILABLE_SHIFTS = ['Semua Shift'] + SHIFT_OPTIONS
 TARGET_SHIFT_TOTAL = 6746 
 
 # ====================================================================
@@ -17,7 +17,7 @@ TARGET_SHIFT_TOTAL = 6746
 
 def create_pareto_chart(df, weight_col, category_col, title):
     if df.empty: return None
-    df_agg = df.groupby(category_col)[weight_col].sum().reset_index()
+    df_agg = df.groupby(category_col, observed=True)[weight_col].sum().reset_index()
     df_agg = df_agg.sort_values(by=weight_col, ascending=False).reset_index(drop=True)
     total_sum = df_agg[weight_col].sum()
     if total_sum == 0: return None
@@ -32,25 +32,46 @@ def create_pareto_chart(df, weight_col, category_col, title):
                       hovermode="x unified", showlegend=False, margin=dict(l=20, r=20, t=50, b=20))
     return fig
 
-@st.cache_data(ttl=300)
-def get_processed_data():
+# cache_resource: frame memory-mapped dibagi ke semua sesi tanpa disalin (read-only)
+@st.cache_resource(ttl=300, max_entries=10)
+def get_processed_data(line=DEFAULT_LINE, version=None):
+    # `version` hanya dipakai sebagai kunci cache: berubah setiap ada penulisan baru
     try:
         from utils import load_data
-        df = load_data()
+        df = load_data(line=line)
     except:
         return pd.DataFrame()
+    # Data sudah tervalidasi oleh skema saat ditulis, tidak perlu dibersihkan lagi
     if df is None or df.empty: return pd.DataFrame()
-    if "Tanggal" in df.columns:
-        df["Tanggal"] = pd.to_datetime(df["Tanggal"], errors="coerce").dt.date
-        df = df.dropna(subset=['Tanggal'])
-    for col in ["Shift", "Mesin", "Varian", "Jenis Reject"]:
-        if col in df.columns:
-            df[col] = df[col].fillna('N/A').astype(str).str.strip()
-    for col in ["Total Reject", "STT Waste (Kg)", "Output (pcs)"]:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
     return df
 
+def render_rollup(start_date, end_date, sel_shift):
+    """Rollup lintas plant/line dari pre-agregat per shard."""
+    try:
+        from utils import load_rollup
+        df_roll = load_rollup()
+    except Exception as e:
+        st.error(f"Gagal memuat rollup: {e}")
+        return
+
+    mask = (df_roll["Tanggal"] >= start_date) & (df_roll["Tanggal"] <= end_date)
+    if sel_shift != 'Semua Shift':
+        mask = mask & (df_roll["Shift"] == sel_shift)
+    df_roll = df_roll[mask].groupby(["Plant", "Line"], as_index=False)[
+        ["Output (pcs)", "STT Waste (Kg)", "Total Reject"]
+    ].sum()
+    if df_roll.empty:
+        st.info("Tidak ada data lintas plant untuk filter ini.")
+        return
+
+    total_kg = (df_roll["Output (pcs)"] * BERAT_PER_PCS_KG) + df_roll["STT Waste (Kg)"]
+    df_roll["Waste Rate (%)"] = np.where(total_kg > 0, df_roll["STT Waste (Kg)"] / total_kg * 100, 0).round(2)
+
+    fig_roll = px.bar(df_roll, x="Line", y="Output (pcs)", color="Plant", text_auto=',.0f')
+    fig_roll.update_layout(height=350, margin=dict(l=10, r=10, t=10, b=10))
+    st.plotly_chart(fig_roll, use_container_width=True)
+    st.dataframe(df_roll, use_container_width=True)
+
 # ====================================================================
 # --- DASHBOARD UTAMA ---
 # ====================================================================
@@ -73,24 +94,31 @@ def run_dashboard():
     st.subheader("📌 Key Performance Indicators (KPI)")
     st.markdown("---")
 
-    df_full = get_processed_data()
+    with st.sidebar:
+        st.header("⚙️ Filter Panel")
+        sel_line = st.selectbox("Pilih Line", list(LINES), format_func=line_label)
+
+    try:
+        from utils import data_version
+        version = data_version(sel_line)
+    except:
+        version = None
+    df_full = get_processed_data(sel_line, version)
     if df_full.empty:
         st.warning("Data tidak tersedia.")
         return
 
     with st.sidebar:
-        st.header("⚙️ Filter Panel")
         if st.button("🔄 Sinkronkan Data"):
-            st.cache_data.clear()
+            get_processed_data.clear()
             st.rerun()
         start_date = st.date_input("Mulai", value=df_full["Tanggal"].min())
         end_date = st.date_input("Sampai", value=df_full["Tanggal"].max())
         sel_shift = st.selectbox("Pilih Shift", options=ALL_AVAILABLE_SHIFTS)
 
-    mask = (df_full["Tanggal"] >= start_date) & (df_full["Tanggal"] <= end_date)
+    mask = date_range_mask(df_full["Tanggal"], start_date, end_date)
     if sel_shift != 'Semua Shift':
-        shift_keyword = sel_shift.split()[-1] if 'Shift' in sel_shift else sel_shift
-        mask = mask & (df_full["Shift"].str.contains(shift_keyword, na=False))
+        mask = mask & (df_full["Shift"] == sel_shift)
     df_filtered = df_full[mask].copy()
 
     df_out = df_filtered[df_filtered["Jenis Reject"] == STT_DUMMY_MESIN]
@@ -118,7 +146,7 @@ def run_dashboard():
     
     with col_v1:
         if not df_out.empty:
-            df_out_var = df_out.groupby("Varian")["Output (pcs)"].sum().reset_index()
+            df_out_var = df_out.groupby("Varian", observed=True)["Output (pcs)"].sum().reset_index()
             ach_total_pct = (t_out_pcs / TARGET_SHIFT_TOTAL) * 100
             
             if ach_total_pct >= 92.5:
@@ -189,7 +217,7 @@ def run_dashboard():
     with col_r1:
         st.subheader("📊 Reject per Varian (Kg)")
         if not df_rej.empty:
-            df_rej_var = df_rej.groupby("Varian")["Total Reject"].sum().reset_index().sort_values("Total Reject")
+            df_rej_var = df_rej.groupby("Varian", observed=True)["Total Reject"].sum().reset_index().sort_values("Total Reject")
             fig_rej_var = px.bar(df_rej_var, y="Varian", x="Total Reject", orientation='h', 
                                  text_auto='.2f', color_discrete_sequence=['#8A2BE2'])
             st.plotly_chart(fig_rej_var, use_container_width=True)
@@ -210,8 +238,14 @@ def run_dashboard():
     with col_p2:
         st.subheader("🔧 Detail Reject per Mesin")
         if not df_rej.empty:
-            df_mesin = df_rej.groupby(["Mesin", "Varian"]).agg({'Total Reject': 'sum'}).reset_index()
+            df_mesin = df_rej.groupby(["Mesin", "Varian"], observed=True).agg({'Total Reject': 'sum'}).reset_index()
             st.dataframe(df_mesin.sort_values("Total Reject", ascending=False), use_container_width=True, height=350)
 
+    # --- ROLLUP LINTAS PLANT (hanya jika ada lebih dari satu line) ---
+    if len(LINES) > 1:
+        st.markdown("---")
+        st.subheader("🏭 Rollup Lintas Plant & Line")
+        render_rollup(start_date, end_date, sel_shift)
+
 if __name__ == "__main__":
     run_dashboard()
\ No newline at end of file
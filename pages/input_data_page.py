@@ -1,70 +1,148 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import time 
+import numpy as np
 
 # Mengimpor fungsi pendukung dari file utils.py
-from utils import load_data, save_data 
+from utils import load_data, data_version, submit_change, get_write_status, match_filter
+from schema import (
+    VARIAN_OPTIONS, JENIS_REJECT_OPTIONS, SHIFT_OPTIONS,
+    STT_DUMMY_MESIN, COLUMNS, CATEGORY_COLS, LINES, DEFAULT_LINE, SchemaError, line_label
+)
 
-# --- DEFINISI KONSTANTA GLOBAL ---
-MESIN_OPTIONS = ["Mesin A1", "Mesin A2", "Mesin A3", "Mesin A4", "Mesin A5", "Mesin A6", "Mesin A7", "Mesin A8", "Mesin A9", "Mesin B0", "Mesin B1", "Mesin B2", "Mesin B3", "Mesin B4", "Mesin B5"]
-VARIAN_OPTIONS = ["Wow Sapagethi Carbonara", "Wow Spagethi Bolognese", "Wow Spagethi Aglio Olio", "Wow Pasta Carbonara", "Wow Pasta Bolognese", "Wow Pasta Aglio Olio"]
-JENIS_REJECT_OPTIONS = ["Kodefikasi", "Ganti Cello", "Kemasan Nginjek Mie", "Kemasan Nginjek Bumbu", "Setting Kemasan", "Kemasan Jebol", "Kemasan Over/Under", "Kemasan Melipat/Ngiris"]
-SHIFT_OPTIONS = ["Shift 1", "Shift 2", "Shift 3"]
+# --- FUNGSI UTAMA DATA ---
 
-STT_DUMMY_MESIN = "STT_DUMMY_OUTPUT" 
-BERAT_PER_PCS_KG = 0.075 
-HOURLY_REJECT_COLS = [f"Jam {i}" for i in range(1, 9)]
+# cache_resource: frame memory-mapped dibagi ke semua sesi tanpa disalin (read-only).
+# `version` hanya kunci cache: berubah setiap ada penulisan baru.
+@st.cache_resource(ttl=300, max_entries=10)
+def get_reject_data(line=DEFAULT_LINE, version=None):
+    loaded_at = datetime.datetime.now()
+    # Data sudah tervalidasi oleh skema saat ditulis, tidak perlu dibersihkan lagi
+    df = load_data(line=line)
+    # Dipakai untuk menentukan apakah penulisan background sudah ikut termuat
+    df.attrs["loaded_at"] = loaded_at
+    return df
 
-COL_ORDER = [
-    "Tanggal","Shift","Mesin","Varian","Jenis Reject",
-    "Jam 1","Jam 2","Jam 3","Jam 4","Jam 5","Jam 6","Jam 7","Jam 8",
-    "Koreksi","Total Reject","STT Waste (Kg)","Output (pcs)"
-]
+def build_overlay(pending):
+    """
+    Overlay dari perubahan yang belum tercermin di cache: (list filter_spec,
+    dataframe baris optimistik). Dibangun sekali per rerun; baris dari
+    perubahan lama yang tertimpa filter perubahan berikutnya dibuang,
+    sama seperti saat journal di-replay.
+    """
+    filters = [write["filter"] for write in pending]
+    df_overlay = pd.DataFrame(
+        [row for write in pending for row in write["rows"]], columns=COLUMNS
+    ).astype({col: object for col in COLUMNS})
+    write_idx = np.array([idx for idx, write in enumerate(pending) for _ in write["rows"]], dtype=int)
+    hidden = np.zeros(len(df_overlay), dtype=bool)
+    for idx, filter_spec in enumerate(filters):
+        hidden |= match_filter(df_overlay, filter_spec) & (write_idx < idx)
+    df_overlay = df_overlay[~hidden].reset_index(drop=True)
+    df_overlay["Tanggal"] = pd.to_datetime(df_overlay["Tanggal"]).dt.date
+    return filters, df_overlay
 
-# --- FUNGSI UTAMA DATA ---
+def query_local(df, overlay, conditions):
+    """
+    Baris yang cocok dengan `conditions` {kolom: nilai} dari data cache,
+    ditambah perubahan sesi ini yang belum tercermin di cache. Frame cache
+    yang dibagi antar sesi tidak disalin; overlay hanya diterapkan ke hasil
+    query yang kecil.
+    """
+    filters, df_overlay = overlay
+    df_result = df[match_filter(df, conditions)]
+    if not filters:
+        return df_result
+
+    hidden = np.zeros(len(df_result), dtype=bool)
+    for filter_spec in filters:
+        hidden |= match_filter(df_result, filter_spec)
+    df_new = df_overlay[match_filter(df_overlay, conditions)]
+    if df_new.empty:
+        return df_result[~hidden]
+    return pd.concat([df_result[~hidden].astype({col: object for col in ["Tanggal"] + CATEGORY_COLS}), df_new], ignore_index=True)
+
+def submit_write(pending, line, filter_spec, rows, label):
+    """
+    Catat perubahan ke journal lewat background writer, simpan sebagai
+    perubahan lokal, dan kembalikan overlay yang sudah diperbarui.
+    """
+    try:
+        job_id = submit_change(filter_spec, rows, line)
+    except SchemaError as e:
+        st.error(f"❌ {label} tidak valid: {e}")
+        return build_overlay(pending)
+    except OSError as e:
+        st.error(f"❌ {label} gagal disimpan: {e}")
+        return build_overlay(pending)
+    write = {"job": job_id, "line": line, "filter": filter_spec, "rows": rows, "label": label}
+    st.session_state.pending_writes.append(write)
+    pending.append(write)
+    st.toast(f"💾 {label} tersimpan, sedang diterapkan...")
+    return build_overlay(pending)
 
-@st.cache_data(ttl=60) # Cache diperpendek agar data cepat update
-def get_reject_data():
-    df = load_data()
-    if df is None or df.empty:
-        return pd.DataFrame(columns=COL_ORDER)
-
-    # Konversi Tanggal
-    df["Tanggal"] = pd.to_datetime(df["Tanggal"], errors="coerce").dt.date
-    df.dropna(subset=['Tanggal'], inplace=True) 
-
-    # Bersihkan String
-    for col in ["Shift", "Mesin", "Varian", "Jenis Reject"]:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.strip() 
-
-    # Konversi Numerik
-    numeric_cols = ["Total Reject", "STT Waste (Kg)", "Output (pcs)", "Koreksi"] + HOURLY_REJECT_COLS
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
-
-    # Hapus baris cacat
-    filter_invalid_dummy = (
-        (df["Jenis Reject"] == STT_DUMMY_MESIN) & 
-        (df["Varian"] == STT_DUMMY_MESIN) &
-        (df["Mesin"] == STT_DUMMY_MESIN)
-    )
-    df = df[~filter_invalid_dummy].copy()
-    return df.sort_values(by=["Tanggal", "Shift"], ascending=False).reset_index(drop=True)
+def get_pending_writes(df, line):
+    """
+    Perubahan milik sesi ini untuk `line` yang belum tercermin di cache.
+    Job yang sudah selesai sebelum cache dimuat tidak perlu ditumpuk lagi.
+    """
+    loaded_at = df.attrs.get("loaded_at")
+    remaining, pending = [], []
+    for write in st.session_state.pending_writes:
+        if write["line"] != line:
+            remaining.append(write)
+            continue
+        status = get_write_status(write["job"])
+        if status["status"] == "done" and loaded_at is not None and status["done_at"] <= loaded_at:
+            continue
+        # Job tidak dikenal writer: hasilnya tidak bisa dikonfirmasi, jangan ditumpuk
+        if status["status"] == "unknown":
+            st.warning(f"⚠️ Status penyimpanan {write['label']} tidak diketahui, periksa kembali datanya.")
+            continue
+        remaining.append(write)
+        pending.append(write)
+    st.session_state.pending_writes = remaining
+    return pending
+
+@st.fragment(run_every="1s")
+def render_write_status():
+    """Indikator status penulisan background, diperbarui tiap detik."""
+    writes = st.session_state.get("pending_writes", [])
+    if not writes:
+        return
+    statuses = [(w, get_write_status(w["job"])) for w in writes]
+    statuses = [(w, s) for w, s in statuses if s["status"] != "unknown"]
+    if not statuses:
+        return
+    journaled = [(w, s) for w, s in statuses if s["status"] == "journaled"]
+    retrying = [(w, s) for w, s in journaled if s["error"]]
+
+    if journaled:
+        st.info(f"⏳ Menerapkan {len(journaled)} perubahan di latar belakang...")
+    else:
+        st.success("✅ Semua perubahan sudah tersimpan.")
+    # Perubahan sudah aman di journal; penerapan yang gagal dicoba ulang otomatis
+    for w, s in retrying:
+        st.warning(f"⚠️ {w['label']} sudah tercatat tetapi belum diterapkan ({s['error']}), dicoba ulang otomatis.")
 
 def initialize_session_state():
     if "input_shift" not in st.session_state:
         st.session_state.input_shift = SHIFT_OPTIONS[0]
     if "input_tanggal" not in st.session_state:
         st.session_state.input_tanggal = datetime.date.today()
+    if "pending_writes" not in st.session_state:
+        st.session_state.pending_writes = []
 
 def input_data_page():
     initialize_session_state()
-    df_reject = get_reject_data()
 
     st.title("📝 Input Data Produksi & Reject")
+    line = st.selectbox("Pilih Line", list(LINES), format_func=line_label, key="input_line")
+    mesin_options = LINES[line]["mesin"]
+    df_reject = get_reject_data(line, data_version(line))
+    pending = get_pending_writes(df_reject, line)
+    overlay = build_overlay(pending)
+    render_write_status()
     
     # ----------------------------------------------------------
     # 1. INPUT DATA REJECT DETAIL
@@ -83,18 +161,17 @@ def input_data_page():
         shift = col_info2.selectbox("Pilih Shift", SHIFT_OPTIONS, 
                                     index=SHIFT_OPTIONS.index(st.session_state.input_shift))
         
-        mesin = col_info3.selectbox("Pilih Mesin", MESIN_OPTIONS)
+        mesin = col_info3.selectbox("Pilih Mesin", mesin_options)
         varian = st.selectbox("Pilih Varian Produk", VARIAN_OPTIONS) 
 
         st.subheader("Input Berat Reject (Kg)")
         data_input = []
         
-        # Filter untuk pre-fill data lama
-        filter_base = (df_reject["Tanggal"] == tanggal) & (df_reject["Shift"] == shift) & \
-                      (df_reject["Mesin"] == mesin) & (df_reject["Varian"] == varian)
+        # Data lama untuk pre-fill
+        df_base = query_local(df_reject, overlay, {"Tanggal": tanggal, "Shift": shift, "Mesin": mesin, "Varian": varian})
 
         for jr in JENIS_REJECT_OPTIONS:
-            df_prefill = df_reject[filter_base & (df_reject["Jenis Reject"] == jr)]
+            df_prefill = df_base[df_base["Jenis Reject"] == jr]
             is_expanded = not df_prefill.empty and (df_prefill['Total Reject'].iloc[0] > 0)
             
             with st.expander(f"🔹 {jr}", expanded=is_expanded):
@@ -103,10 +180,10 @@ def input_data_page():
                 for i in range(8):
                     jam_col = f"Jam {i+1}"
                     default_val = float(df_prefill[jam_col].iloc[0]) if not df_prefill.empty else 0.0
-                    val = cols[i % 4].number_input(f"Jam {i+1}", min_value=0.0, step=0.01, value=default_val, key=f"r-{mesin}-{jr}-{i}")
+                    val = cols[i % 4].number_input(f"Jam {i+1}", min_value=0.0, step=0.01, value=default_val, key=f"r-{line}-{mesin}-{jr}-{i}")
                     nilai_jam.append(val)
                 
-                koreksi = st.number_input(f"Koreksi {jr} (±)", value=float(df_prefill['Koreksi'].iloc[0]) if not df_prefill.empty else 0.0, key=f"k-{mesin}-{jr}")
+                koreksi = st.number_input(f"Koreksi {jr} (±)", value=float(df_prefill['Koreksi'].iloc[0]) if not df_prefill.empty else 0.0, key=f"k-{line}-{mesin}-{jr}")
                 total = sum(nilai_jam) + koreksi
                 st.caption(f"Total: {total:.2f} Kg")
                 data_input.append({"jr": jr, "jam": nilai_jam, "kor": koreksi, "tot": total})
@@ -114,14 +191,11 @@ def input_data_page():
         submitted_reject = st.form_submit_button("💾 SIMPAN DATA REJECT")
 
     if submitted_reject:
-        df_full = load_data()
         str_tgl = str(tanggal)
-        # Filter hapus data lama
-        filter_old = (df_full["Tanggal"].astype(str) == str_tgl) & (df_full["Shift"] == shift) & \
-                     (df_full["Mesin"] == mesin) & (df_full["Varian"] == varian) & \
-                     (df_full["Jenis Reject"].isin(JENIS_REJECT_OPTIONS))
+        # Baris lama untuk kombinasi ini diganti dengan baris baru (lewat journal)
+        filter_old = {"Tanggal": str_tgl, "Shift": shift, "Mesin": mesin, "Varian": varian,
+                      "Jenis Reject": JENIS_REJECT_OPTIONS}
         
-        df_updated = df_full[~filter_old].copy()
         new_rows = []
         for item in data_input:
             if item["tot"] != 0:
@@ -130,12 +204,7 @@ def input_data_page():
                 for i in range(8): row[f"Jam {i+1}"] = item["jam"][i]
                 new_rows.append(row)
         
-        df_final = pd.concat([df_updated, pd.DataFrame(new_rows)], ignore_index=True)[COL_ORDER]
-        if save_data(df_final, "Data Berhasil Disimpan"):
-            st.cache_data.clear()
-            st.success("✅ Data Reject Berhasil Diperbarui!")
-            time.sleep(1)
-            st.rerun()
+        overlay = submit_write(pending, line, filter_old, new_rows, f"Reject {mesin} ({shift}, {str_tgl})")
 
     st.divider()
 
@@ -149,8 +218,8 @@ def input_data_page():
         shf_w = c2.selectbox("Shift", SHIFT_OPTIONS, index=SHIFT_OPTIONS.index(shift), key="shf_w")
         var_w = st.selectbox("Varian", VARIAN_OPTIONS, key="var_w")
         
-        df_stt_old = df_reject[(df_reject["Tanggal"] == tgl_w) & (df_reject["Shift"] == shf_w) & 
-                               (df_reject["Varian"] == var_w) & (df_reject["Jenis Reject"] == STT_DUMMY_MESIN)]
+        df_stt_old = query_local(df_reject, overlay, {"Tanggal": tgl_w, "Shift": shf_w, "Varian": var_w,
+                                                      "Jenis Reject": STT_DUMMY_MESIN})
         
         def_stt = float(df_stt_old["STT Waste (Kg)"].iloc[0]) if not df_stt_old.empty else 0.0
         def_out = int(df_stt_old["Output (pcs)"].iloc[0]) if not df_stt_old.empty else 0
@@ -162,22 +231,16 @@ def input_data_page():
         submitted_stt = st.form_submit_button("💾 SIMPAN STT & OUTPUT")
 
     if submitted_stt:
-        df_full = load_data()
-        filter_stt = (df_full["Tanggal"].astype(str) == str(tgl_w)) & (df_full["Shift"] == shf_w) & \
-                     (df_full["Varian"] == var_w) & (df_full["Jenis Reject"] == STT_DUMMY_MESIN)
+        filter_stt = {"Tanggal": str(tgl_w), "Shift": shf_w, "Varian": var_w, "Jenis Reject": STT_DUMMY_MESIN}
         
-        df_updated = df_full[~filter_stt].copy()
+        new_rows = []
         if stt_val > 0 or out_val > 0:
             new_stt = {"Tanggal": str(tgl_w), "Shift": shf_w, "Mesin": var_w, "Varian": var_w, "Jenis Reject": STT_DUMMY_MESIN,
                        "STT Waste (Kg)": stt_val, "Output (pcs)": out_val, "Total Reject": 0, "Koreksi": 0}
             for i in range(8): new_stt[f"Jam {i+1}"] = 0
-            df_updated = pd.concat([df_updated, pd.DataFrame([new_stt])], ignore_index=True)
+            new_rows.append(new_stt)
         
-        if save_data(df_updated[COL_ORDER], "Data STT Disimpan"):
-            st.cache_data.clear()
-            st.success("✅ Data STT & Output Berhasil Disimpan!")
-            time.sleep(1)
-            st.rerun()
+        overlay = submit_write(pending, line, filter_stt, new_rows, f"STT & Output {var_w} ({shf_w}, {tgl_w})")
 
     # ----------------------------------------------------------
     # 3. PREVIEW
@@ -188,7 +251,7 @@ def input_data_page():
     p_tgl = c_p1.date_input("Filter Tanggal", value=tanggal)
     p_shf = c_p2.selectbox("Filter Shift", SHIFT_OPTIONS, index=SHIFT_OPTIONS.index(shift))
     
-    df_view = df_reject[(df_reject["Tanggal"] == p_tgl) & (df_reject["Shift"] == p_shf)]
+    df_view = query_local(df_reject, overlay, {"Tanggal": p_tgl, "Shift": p_shf})
     if not df_view.empty:
         st.dataframe(df_view, use_container_width=True)
     else:
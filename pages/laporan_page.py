@@ -5,25 +5,14 @@ import datetime
 import plotly.express as px
 from streamlit_extras.switch_page_button import switch_page 
 
-# --- KONSTANTA GLOBAL ---
-STT_DUMMY_MESIN = "STT_DUMMY_OUTPUT"
-BERAT_PER_PCS_KG = 0.075
+from schema import STT_DUMMY_MESIN, BERAT_PER_PCS_KG, LINES, DEFAULT_LINE, line_label, date_range_mask
 
-def get_data_laporan():
-    """Fungsi mandiri untuk mengambil data dengan pembersihan tipe data"""
+def get_data_laporan(as_of=None, line=DEFAULT_LINE):
+    """Fungsi mandiri untuk mengambil data (sudah tervalidasi oleh skema saat ditulis)"""
     try:
         from utils import load_data
-        df = load_data()
+        df = load_data(as_of=as_of, line=line)
         if df is not None and not df.empty:
-            # Pastikan Tanggal dalam format date
-            df["Tanggal"] = pd.to_datetime(df["Tanggal"], errors="coerce").dt.date
-            df = df.dropna(subset=['Tanggal'])
-            
-            # Konversi kolom numerik yang kritikal
-            cols_to_fix = ["Total Reject", "STT Waste (Kg)", "Output (pcs)", "Koreksi"]
-            for col in cols_to_fix:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
             return df
     except Exception as e:
         st.error(f"Gagal memuat data: {e}")
@@ -44,11 +33,23 @@ def run_laporan():
             switch_page("app")
         st.divider()
 
+        sel_line = st.selectbox("Pilih Line", list(LINES), format_func=line_label)
+
+        # Audit: rekonstruksi data sesuai kondisi pada waktu tertentu dari journal
+        as_of = None
+        if st.checkbox("🕒 Lihat Data per Waktu (Audit)"):
+            tgl_audit = st.date_input("Tanggal Audit", value=datetime.date.today(), key="tgl_audit")
+            jam_audit = st.time_input("Jam Audit", value=datetime.time(23, 59), key="jam_audit")
+            as_of = datetime.datetime.combine(tgl_audit, jam_audit)
+
     # --- 3. HEADER HALAMAN ---
     st.title("📄 Laporan Produksi & Waste Harian")
     st.info("Gunakan halaman ini untuk melihat performa antar shift dan mendownload data untuk audit.")
 
-    df_full = get_data_laporan()
+    if as_of is not None:
+        st.caption(f"Menampilkan kondisi data per **{as_of:%d-%m-%Y %H:%M}**.")
+
+    df_full = get_data_laporan(as_of, sel_line)
     if df_full.empty:
         st.warning("Belum ada data yang tersimpan di sistem.")
         return
@@ -67,7 +68,7 @@ def run_laporan():
             sel_shift = st.selectbox("Pilih Shift", list_shift)
 
     # Eksekusi Filter
-    mask = (df_full["Tanggal"] >= start_date) & (df_full["Tanggal"] <= end_date)
+    mask = date_range_mask(df_full["Tanggal"], start_date, end_date)
     if sel_shift != "Semua Shift":
         mask = mask & (df_full["Shift"] == sel_shift)
     
@@ -83,13 +84,13 @@ def run_laporan():
     df_rej_detail = df_filtered[df_filtered["Jenis Reject"] != STT_DUMMY_MESIN]
 
     # Agregasi data Output & STT
-    summary = df_out.groupby(["Tanggal", "Shift"]).agg({
+    summary = df_out.groupby(["Tanggal", "Shift"], observed=True).agg({
         "Output (pcs)": "sum",
         "STT Waste (Kg)": "sum"
     }).reset_index()
 
     # Agregasi data Reject Detail (untuk cross-check/sinkronisasi)
-    rej_val = df_rej_detail.groupby(["Tanggal", "Shift"])["Total Reject"].sum().reset_index()
+    rej_val = df_rej_detail.groupby(["Tanggal", "Shift"], observed=True)["Total Reject"].sum().reset_index()
     
     # Gabungkan menjadi satu Laporan Final
     report_final = pd.merge(summary, rej_val, on=["Tanggal", "Shift"], how="left").fillna(0)
@@ -163,7 +164,7 @@ def run_laporan():
     st.download_button(
         label="📥 Download Laporan Lengkap (.xlsx)",
         data=buffer.getvalue(),
-        file_name=f"Laporan_Produksi_{start_date}_ke_{end_date}.xlsx",
+        file_name=f"Laporan_Produksi_{sel_line}_{start_date}_ke_{end_date}.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         use_container_width=True
     )
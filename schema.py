@@ -0,0 +1,151 @@
+import datetime
+import pandas as pd
+import numpy as np
+
+# ====================================================================
+# --- SKEMA DATA PRODUKSI ---
+# Satu-satunya sumber definisi kolom, tipe data, dan aturan validasi.
+# Validasi dijalankan sekali saat data ditulis/diimpor (lihat utils.py),
+# sehingga data di disk bisa langsung dipakai tanpa pembersihan ulang.
+# ====================================================================
+
+# --- KONSTANTA DOMAIN ---
+BERAT_PER_PCS_KG = 0.075
+STT_DUMMY_MESIN = "STT_DUMMY_OUTPUT"
+
+MESIN_OPTIONS = ["Mesin A1", "Mesin A2", "Mesin A3", "Mesin A4", "Mesin A5", "Mesin A6", "Mesin A7", "Mesin A8", "Mesin A9", "Mesin B0", "Mesin B1", "Mesin B2", "Mesin B3", "Mesin B4", "Mesin B5"]
+VARIAN_OPTIONS = ["Wow Sapagethi Carbonara", "Wow Spagethi Bolognese", "Wow Spagethi Aglio Olio", "Wow Pasta Carbonara", "Wow Pasta Bolognese", "Wow Pasta Aglio Olio"]
+JENIS_REJECT_OPTIONS = ["Kodefikasi", "Ganti Cello", "Kemasan Nginjek Mie", "Kemasan Nginjek Bumbu", "Setting Kemasan", "Kemasan Jebol", "Kemasan Over/Under", "Kemasan Melipat/Ngiris"]
+SHIFT_OPTIONS = ["Shift 1", "Shift 2", "Shift 3"]
+
+# --- PLANT & LINE ---
+# Setiap line disimpan di shard sendiri (lihat utils.py). Line default memakai
+# file lama agar deployment satu line tetap berjalan tanpa migrasi.
+# Menambah line cukup dengan menambah entri di sini.
+DEFAULT_LINE = "L1"
+LINES = {
+    "L1": {"plant": "Plant 1", "nama": "Line 1", "mesin": MESIN_OPTIONS},
+}
+
+def line_label(line):
+    return f"{LINES[line]['plant']} - {LINES[line]['nama']}"
+
+# --- KOLOM ---
+HOURLY_REJECT_COLS = [f"Jam {i}" for i in range(1, 9)]
+CATEGORY_COLS = ["Shift", "Mesin", "Varian", "Jenis Reject"]
+MEASURE_COLS = HOURLY_REJECT_COLS + ["Koreksi", "Total Reject", "STT Waste (Kg)", "Output (pcs)"]
+
+COLUMNS = ["Tanggal"] + CATEGORY_COLS + MEASURE_COLS
+
+# Identitas baris: satu baris per kombinasi ini dalam satu line. Baris STT
+# memakai Varian sebagai Mesin sehingga tetap unik per Tanggal/Shift/Varian.
+NATURAL_KEY = ["Tanggal", "Shift", "Mesin", "Varian", "Jenis Reject"]
+
+# Tipe data di disk: Tanggal disimpan sebagai string ISO (YYYY-MM-DD)
+DISK_DTYPES = {"Tanggal": str, **{col: str for col in CATEGORY_COLS}, **{col: "float64" for col in MEASURE_COLS}}
+
+# Nama kolom lama yang masih mungkin ada di file hasil impor
+LEGACY_COLUMNS = {"Output (crt)": "Output (pcs)"}
+
+# Toleransi pembulatan untuk cek Total Reject = sum(Jam) + Koreksi
+TOLERANSI_TOTAL = 0.01
+
+class SchemaError(ValueError):
+    """Data tidak memenuhi skema; pesan berisi alasan penolakan."""
+
+def empty_frame():
+    """Dataframe kosong dengan kolom dan tipe data sesuai skema disk."""
+    return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in DISK_DTYPES.items()})[COLUMNS]
+
+def validate(df, line=DEFAULT_LINE):
+    """
+    Validasi & normalisasi vektor untuk seluruh dataframe milik satu line.
+    Mengembalikan (df_valid, df_invalid); df_invalid memiliki kolom tambahan
+    "Alasan" berisi aturan pertama yang dilanggar.
+    """
+    df = df.rename(columns=LEGACY_COLUMNS)
+    missing = [col for col in COLUMNS if col not in df.columns]
+    if missing:
+        raise SchemaError(f"Kolom tidak ditemukan: {', '.join(missing)}")
+
+    df = df[COLUMNS].dropna(how='all').copy()
+
+    # Normalisasi tipe
+    tanggal_asli = df["Tanggal"]
+    tanggal = pd.to_datetime(tanggal_asli.astype(str).str.strip(), errors="coerce")
+    df["Tanggal"] = tanggal.dt.strftime("%Y-%m-%d")
+    for col in CATEGORY_COLS:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str).str.strip())
+    for col in MEASURE_COLS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0).astype("float64")
+
+    # Aturan domain, dicek berurutan
+    is_dummy = df["Jenis Reject"] == STT_DUMMY_MESIN
+    selisih_total = (df[HOURLY_REJECT_COLS].sum(axis=1) + df["Koreksi"] - df["Total Reject"]).abs()
+    checks = [
+        (tanggal.isna(), "Tanggal tidak valid"),
+        (df[CATEGORY_COLS].isna().any(axis=1) | (df[CATEGORY_COLS] == "").any(axis=1), "Kolom kategori kosong"),
+        (~df["Shift"].isin(SHIFT_OPTIONS), "Shift tidak dikenal"),
+        (~df["Jenis Reject"].isin(JENIS_REJECT_OPTIONS + [STT_DUMMY_MESIN]), "Jenis Reject tidak dikenal"),
+        (~df["Varian"].isin(VARIAN_OPTIONS), "Varian tidak dikenal"),
+        (~is_dummy & ~df["Mesin"].isin(LINES[line]["mesin"]), "Mesin tidak dikenal"),
+        ((df[HOURLY_REJECT_COLS] < 0).any(axis=1) | (df["STT Waste (Kg)"] < 0) | (df["Output (pcs)"] < 0), "Nilai negatif"),
+        (~is_dummy & (selisih_total > TOLERANSI_TOTAL), "Total Reject tidak sama dengan jumlah Jam + Koreksi"),
+        (is_dummy & (df["Mesin"] != df["Varian"]), "Baris STT harus memakai Varian sebagai Mesin"),
+        (is_dummy & ((df[HOURLY_REJECT_COLS] != 0).any(axis=1) | (df["Total Reject"] != 0)), "Baris STT tidak boleh berisi reject"),
+    ]
+    # Duplikat dicek di antara baris yang lolos aturan lain. Koreksi pada data
+    # lama selalu ditambahkan di akhir file, jadi baris terakhir yang dipakai.
+    lolos = ~np.logical_or.reduce([mask.to_numpy() for mask, _ in checks])
+    duplikat = pd.Series(False, index=df.index)
+    duplikat[lolos] = df[lolos].duplicated(subset=NATURAL_KEY, keep="last")
+    checks.append((duplikat, "Duplikat kunci (Tanggal, Shift, Mesin, Varian, Jenis Reject)"))
+    alasan = pd.Series(
+        np.select([mask.to_numpy() for mask, _ in checks], [reason for _, reason in checks], default=""),
+        index=df.index
+    )
+    invalid = alasan != ""
+
+    df_valid = df[~invalid].reset_index(drop=True)
+    df_invalid = df[invalid].assign(Tanggal=tanggal_asli[invalid], Alasan=alasan[invalid]).reset_index(drop=True)
+    return df_valid, df_invalid
+
+def validate_rows(rows, line=DEFAULT_LINE):
+    """Validasi baris dari form input. Raise SchemaError jika ada yang tidak valid."""
+    if not rows:
+        return []
+    df_valid, df_invalid = validate(pd.DataFrame(rows), line)
+    if not df_invalid.empty:
+        raise SchemaError("; ".join(df_invalid["Alasan"].unique()))
+    return df_valid.to_dict("records")
+
+def hash_keys(df):
+    """Hash uint64 per baris dari kolom NATURAL_KEY (data bertipe disk)."""
+    return pd.util.hash_pandas_object(df[NATURAL_KEY], index=False).to_numpy()
+
+def hash_rows(df):
+    """Hash uint64 per baris dari seluruh isi kolom, untuk deteksi perubahan."""
+    return pd.util.hash_pandas_object(df[COLUMNS], index=False).to_numpy()
+
+def tanggal_categorical(codes, iso_dates):
+    """
+    Tanggal sebagai Categorical terurut di atas array kode (kategori:
+    datetime.date dari string ISO yang sudah terurut). Tidak ada array
+    objek per baris; perbandingan rentang pakai date_range_mask.
+    """
+    dtype = pd.CategoricalDtype([datetime.date.fromisoformat(v) for v in iso_dates], ordered=True)
+    return pd.Categorical.from_codes(codes, dtype=dtype, validate=False)
+
+def date_range_mask(tanggal, start, end):
+    """Mask numpy start <= Tanggal <= end, dihitung dari kode kategori Tanggal."""
+    categories = tanggal.cat.categories
+    lo = categories.searchsorted(start, side="left")
+    hi = categories.searchsorted(end, side="right")
+    codes = tanggal.cat.codes.to_numpy()
+    return (codes >= lo) & (codes < hi)
+
+def from_disk(df):
+    """Konversi data tervalidasi dari disk ke tipe yang dipakai halaman (Tanggal -> Categorical date)."""
+    codes, uniques = pd.factorize(df["Tanggal"], sort=True)
+    df["Tanggal"] = tanggal_categorical(codes, uniques)
+    return df
@@ -0,0 +1,12 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Jalankan test di direktori kosong; semua path data di utils relatif ke cwd."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,111 @@
+import datetime
+
+import column_store
+import utils
+from schema import HOURLY_REJECT_COLS, STT_DUMMY_MESIN
+
+def stt_row(tanggal, output):
+    row = {"Tanggal": tanggal, "Shift": "Shift 1", "Mesin": "Wow Pasta Carbonara", "Varian": "Wow Pasta Carbonara",
+           "Jenis Reject": STT_DUMMY_MESIN, "Koreksi": 0, "Total Reject": 0, "STT Waste (Kg)": 1.0, "Output (pcs)": output}
+    row.update({col: 0 for col in HOURLY_REJECT_COLS})
+    return row
+
+def write_stt(tanggal, output):
+    filter_spec = {"Tanggal": tanggal, "Shift": "Shift 1", "Varian": "Wow Pasta Carbonara", "Jenis Reject": STT_DUMMY_MESIN}
+    return utils._apply_changes([(filter_spec, [stt_row(tanggal, output)])])
+
+def test_partial_journal_line_is_truncated_before_append(data_dir):
+    for day in range(1, 4):
+        write_stt(f"2024-01-0{day}", 100)
+    with open(utils.JOURNAL_PATH, "a", encoding="utf-8") as f:
+        f.write('{"seq": 4, "ts": "2024-01-0')
+
+    seqs = [write_stt(f"2024-02-0{day}", 200) for day in range(1, 4)]
+
+    assert seqs == [4, 5, 6]
+    assert [e["seq"] for e in utils._read_journal(utils.DEFAULT_LINE)] == list(range(7))
+    assert utils.data_version() == 6
+    df = utils.load_data(as_of=datetime.datetime.now())
+    assert sorted(str(t) for t in df["Tanggal"]) == [f"2024-0{m}-0{d}" for m in (1, 2) for d in (1, 2, 3)]
+    assert len(utils.diff_data(5, 6)) == 1
+
+def test_partial_line_after_checkpoint_needs_no_replay(data_dir):
+    write_stt("2024-01-01", 100)
+    with open(utils.JOURNAL_PATH, "a", encoding="utf-8") as f:
+        f.write('{"seq": 2, "op": "repl')
+
+    assert utils.recover_data() is False
+    with open(utils.JOURNAL_PATH, "rb") as f:
+        assert f.read().endswith(b"\n")
+    assert write_stt("2024-01-02", 100) == 2
+
+def test_journal_rotates_at_snapshot_and_as_of_uses_archive(data_dir, monkeypatch):
+    monkeypatch.setattr(utils, "SNAPSHOT_INTERVAL", 3)
+    monkeypatch.setattr(utils, "SNAPSHOT_RETENTION", 2)
+    monkeypatch.setattr(utils, "SNAPSHOT_THIN_FACTOR", 2)
+    checkpoints = []
+    for day in range(1, 16):
+        write_stt(f"2024-01-{day:02d}", day)
+        checkpoints.append(datetime.datetime.now())
+
+    # Journal aktif dimulai dari snapshot seq 15 dan hanya berisi entri sesudahnya
+    assert [e["seq"] for e in utils._read_journal(utils.DEFAULT_LINE)] == [15]
+    assert utils.recover_data() is False
+    assert write_stt("2024-01-16", 16) == 16
+
+    # Semua arsip journal disimpan; snapshot lama dijarangkan (9 sebucket dengan 6)
+    names = sorted(p.name for p in (data_dir / utils.SNAPSHOT_DIR).iterdir())
+    assert [n for n in names if n.startswith("journal_")] == [
+        f"journal_{seq:08d}.jsonl" for seq in (0, 3, 6, 9, 12)]
+    assert [n for n in names if n.startswith("snapshot_")] == [
+        f"snapshot_{seq:08d}.csv" for seq in (0, 3, 6, 12, 15)]
+
+    # Setiap titik waktu tetap bisa direkonstruksi, termasuk yang snapshot-nya sudah dihapus
+    for day in (1, 3, 8, 10, 11, 15):
+        df = utils.load_data(as_of=checkpoints[day - 1])
+        assert len(df) == day
+        assert df["Output (pcs)"].sum() == sum(range(1, day + 1))
+
+def test_rotation_carries_entries_not_yet_applied(data_dir):
+    write_stt("2024-01-01", 1)
+    seq = utils._journal_changes([({"Tanggal": "2024-01-02"}, [stt_row("2024-01-02", 2)])])[-1]
+    utils._write_snapshot(utils._read_state(utils.FILE_PATH), 1, utils.DEFAULT_LINE)
+    utils._rotate_journal(1, utils._now(), utils.DEFAULT_LINE, derived=True)
+
+    assert [e["seq"] for e in utils._read_journal(utils.DEFAULT_LINE)] == [1, seq]
+    assert utils.recover_data() is True
+    assert utils.load_data()["Output (pcs)"].sum() == 3
+
+def test_upsert_replaces_same_key_outside_filter(data_dir):
+    write_stt("2024-01-01", 100)
+    utils._apply_changes([({"Tanggal": "2024-01-02"}, [stt_row("2024-01-01", 200)])])
+
+    df = utils.load_data()
+    assert len(df) == 1
+    assert df["Output (pcs)"].tolist() == [200]
+
+def test_diff_labels_added_changed_and_removed_keys(data_dir):
+    write_stt("2024-01-01", 100)
+    old_version = write_stt("2024-01-02", 100)
+    new_version = utils._apply_changes([
+        ({"Tanggal": "2024-01-01"}, [stt_row("2024-01-01", 150)]),
+        ({"Tanggal": "2024-01-02"}, []),
+        ({"Tanggal": "2024-01-03"}, [stt_row("2024-01-03", 100)]),
+    ])
+
+    df_diff = utils.diff_data(old_version, new_version)
+    assert sorted(zip(df_diff["Tanggal"].astype(str), df_diff["Perubahan"])) == [
+        ("2024-01-01", "ubah"), ("2024-01-02", "hapus"), ("2024-01-03", "tambah")]
+
+def test_identical_resubmit_has_empty_diff(data_dir):
+    old_version = write_stt("2024-01-01", 100)
+    new_version = write_stt("2024-01-01", 100)
+
+    assert new_version > old_version
+    assert utils.diff_data(old_version, new_version).empty
+
+def test_diff_of_pruned_version_is_none(data_dir):
+    versions = [write_stt(f"2024-01-{day:02d}", day) for day in range(1, column_store.STORE_RETENTION + 3)]
+
+    assert utils.diff_data(versions[0], versions[-1]) is None
+    assert len(utils.diff_data(versions[-column_store.STORE_RETENTION], versions[-1])) == column_store.STORE_RETENTION - 1
@@ -0,0 +1,80 @@
+import pytest
+
+import utils
+from schema import HOURLY_REJECT_COLS, LINES, STT_DUMMY_MESIN
+
+VARIAN = "Wow Pasta Carbonara"
+
+def make_row(tanggal, mesin, jenis_reject, total_reject=0.0, output=0.0):
+    row = {"Tanggal": tanggal, "Shift": "Shift 1", "Mesin": mesin, "Varian": VARIAN, "Jenis Reject": jenis_reject,
+           "Koreksi": 0.0, "Total Reject": total_reject, "STT Waste (Kg)": 0.0, "Output (pcs)": output}
+    row.update({col: 0.0 for col in HOURLY_REJECT_COLS})
+    row["Jam 1"] = total_reject
+    return row
+
+def write_day(tanggal, output, reject=0.0, line=utils.DEFAULT_LINE):
+    rows = [make_row(tanggal, VARIAN, STT_DUMMY_MESIN, output=output)]
+    if reject:
+        rows.append(make_row(tanggal, LINES[line]["mesin"][0], "Kodefikasi", total_reject=reject))
+    return utils._apply_changes([({"Tanggal": tanggal}, rows)], line)
+
+def rollup_by_date(line_name="Line 1"):
+    df_roll = utils.load_rollup()
+    df_roll = df_roll[df_roll["Line"] == line_name]
+    return {str(t): (out, rej) for t, out, rej in zip(df_roll["Tanggal"], df_roll["Output (pcs)"], df_roll["Total Reject"])}
+
+@pytest.fixture(autouse=True)
+def empty_agg_cache(monkeypatch):
+    monkeypatch.setattr(utils, "_AGG_CACHE", {})
+
+@pytest.fixture
+def second_line(monkeypatch):
+    monkeypatch.setitem(LINES, "L2", {"plant": "Plant 2", "nama": "Line 2", "mesin": ["Mesin C1"]})
+    return "L2"
+
+def test_rollup_recomputes_only_changed_dates(data_dir, monkeypatch):
+    write_day("2024-01-01", 100)
+    write_day("2024-01-02", 100, reject=2.0)
+    write_day("2024-01-04", 100)
+    assert rollup_by_date() == {
+        "2024-01-01": (100, 0), "2024-01-02": (100, 2), "2024-01-04": (100, 0)}
+
+    utils._apply_changes([
+        ({"Tanggal": "2024-01-01"}, [make_row("2024-01-01", VARIAN, STT_DUMMY_MESIN, output=150)]),
+        ({"Tanggal": "2024-01-02"}, []),
+        ({"Tanggal": "2024-01-03"}, [make_row("2024-01-03", VARIAN, STT_DUMMY_MESIN, output=100)]),
+    ])
+    aggregated_dates = []
+    aggregate_shard = utils.aggregate_shard
+    def spy(df):
+        aggregated_dates.append(sorted(str(t) for t in set(df["Tanggal"])))
+        return aggregate_shard(df)
+    monkeypatch.setattr(utils, "aggregate_shard", spy)
+
+    # Tanggal 2024-01-02 yang seluruh barisnya dihapus ikut hilang dari rollup
+    expected = {"2024-01-01": (150, 0), "2024-01-03": (100, 0), "2024-01-04": (100, 0)}
+    assert rollup_by_date() == expected
+    assert aggregated_dates == [["2024-01-01", "2024-01-03"]]
+
+    monkeypatch.setattr(utils, "_AGG_CACHE", {})
+    assert rollup_by_date() == expected
+
+def test_rollup_reads_each_line_from_its_shard(data_dir, second_line):
+    write_day("2024-01-01", 100, reject=1.0)
+    write_day("2024-01-01", 300, reject=4.0, line=second_line)
+
+    # Line default tetap di file lama, line lain di shards/<line>/
+    assert (data_dir / utils.JOURNAL_PATH).exists()
+    assert (data_dir / utils.SHARD_DIR / second_line / utils.JOURNAL_PATH).exists()
+    assert (data_dir / utils.SHARD_DIR / second_line / utils.STORE_DIR).is_dir()
+    assert not (data_dir / utils.SHARD_DIR / utils.DEFAULT_LINE).exists()
+
+    assert rollup_by_date("Line 1") == {"2024-01-01": (100, 1)}
+    assert rollup_by_date("Line 2") == {"2024-01-01": (300, 4)}
+    assert set(utils.load_rollup()["Plant"]) == {"Plant 1", "Plant 2"}
+
+def test_rollup_of_line_without_data_is_empty(data_dir, second_line):
+    write_day("2024-01-01", 100)
+
+    assert rollup_by_date("Line 2") == {}
+    assert not (data_dir / utils.SHARD_DIR).exists()
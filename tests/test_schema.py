@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+from schema import HOURLY_REJECT_COLS, STT_DUMMY_MESIN, SchemaError, validate
+
+def reject_row(**changes):
+    row = {"Tanggal": "2024-01-01", "Shift": "Shift 1", "Mesin": "Mesin A1", "Varian": "Wow Pasta Carbonara",
+           "Jenis Reject": "Kodefikasi", "Koreksi": 0.0, "Total Reject": 2.0, "STT Waste (Kg)": 0.0, "Output (pcs)": 0.0}
+    row.update({col: 0.0 for col in HOURLY_REJECT_COLS})
+    row["Jam 1"] = 2.0
+    row.update(changes)
+    return row
+
+def stt_row(**changes):
+    return reject_row(**{"Mesin": "Wow Pasta Carbonara", "Jenis Reject": STT_DUMMY_MESIN, "Jam 1": 0.0,
+                         "Total Reject": 0.0, "STT Waste (Kg)": 1.5, "Output (pcs)": 100.0, **changes})
+
+@pytest.mark.parametrize("row, alasan", [
+    (reject_row(Tanggal="2024-13-45"), "Tanggal tidak valid"),
+    (reject_row(Mesin=""), "Kolom kategori kosong"),
+    (reject_row(Varian=None), "Kolom kategori kosong"),
+    (reject_row(Shift="Shift 9"), "Shift tidak dikenal"),
+    (reject_row(**{"Jenis Reject": "Lainnya"}), "Jenis Reject tidak dikenal"),
+    (reject_row(Varian="Wow Mie Goreng"), "Varian tidak dikenal"),
+    (reject_row(Mesin="Mesin Z9"), "Mesin tidak dikenal"),
+    (reject_row(**{"Jam 1": -1.0, "Total Reject": -1.0}), "Nilai negatif"),
+    (stt_row(**{"Output (pcs)": -5.0}), "Nilai negatif"),
+    (reject_row(**{"Total Reject": 5.0}), "Total Reject tidak sama dengan jumlah Jam + Koreksi"),
+    (stt_row(Mesin="Mesin A1"), "Baris STT harus memakai Varian sebagai Mesin"),
+    (stt_row(**{"Jam 1": 1.0, "Total Reject": 1.0}), "Baris STT tidak boleh berisi reject"),
+])
+def test_each_rule_rejects_row(row, alasan):
+    df_valid, df_invalid = validate(pd.DataFrame([reject_row(Tanggal="2024-01-02"), row]))
+
+    assert len(df_valid) == 1
+    assert df_invalid["Alasan"].tolist() == [alasan]
+
+def test_valid_rows_are_normalized():
+    df_valid, df_invalid = validate(pd.DataFrame([reject_row(Shift=" Shift 1 ", Tanggal="2024-1-5"), stt_row()]))
+
+    assert df_invalid.empty
+    assert df_valid["Tanggal"].tolist() == ["2024-01-05", "2024-01-01"]
+    assert df_valid["Shift"].tolist() == ["Shift 1", "Shift 1"]
+
+def test_duplicate_key_keeps_last_row():
+    df_valid, df_invalid = validate(pd.DataFrame([reject_row(), reject_row(**{"Jam 1": 3.0, "Total Reject": 3.0})]))
+
+    assert df_valid["Total Reject"].tolist() == [3.0]
+    assert df_invalid["Total Reject"].tolist() == [2.0]
+    assert df_invalid["Alasan"].str.startswith("Duplikat kunci").all()
+
+def test_invalid_row_does_not_make_valid_row_a_duplicate():
+    df_valid, df_invalid = validate(pd.DataFrame([reject_row(), reject_row(**{"Total Reject": 9.0})]))
+
+    assert df_valid["Total Reject"].tolist() == [2.0]
+    assert df_invalid["Alasan"].tolist() == ["Total Reject tidak sama dengan jumlah Jam + Koreksi"]
+
+def test_legacy_output_column_is_renamed():
+    row = stt_row()
+    row["Output (crt)"] = row.pop("Output (pcs)")
+
+    df_valid, df_invalid = validate(pd.DataFrame([row]))
+
+    assert df_invalid.empty
+    assert df_valid["Output (pcs)"].tolist() == [100.0]
+
+def test_missing_column_raises():
+    with pytest.raises(SchemaError, match="Koreksi"):
+        validate(pd.DataFrame([reject_row()]).drop(columns=["Koreksi"]))
+
+def test_rejected_rows_keep_original_tanggal():
+    rows = [reject_row(Tanggal=" 2024-01-05", Shift="Shift 9"), reject_row(Tanggal="kemarin")]
+
+    _, df_invalid = validate(pd.DataFrame(rows))
+
+    assert df_invalid["Tanggal"].tolist() == [" 2024-01-05", "kemarin"]
+    assert df_invalid["Alasan"].tolist() == ["Shift tidak dikenal", "Tanggal tidak valid"]
@@ -0,0 +1,45 @@
+import time
+
+import utils
+from test_journal import stt_row
+
+FILTER = {"Tanggal": "2024-01-01", "Shift": "Shift 1", "Varian": "Wow Pasta Carbonara", "Jenis Reject": "STT_DUMMY_OUTPUT"}
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+def test_submit_is_journaled_before_it_returns(data_dir, monkeypatch):
+    # Writer yang tidak pernah menerapkan apa pun: hanya journal yang menjamin perubahan
+    monkeypatch.setattr(utils.BackgroundWriter, "_run", lambda self: None)
+    writer = utils.BackgroundWriter()
+    job = writer.submit(FILTER, [stt_row("2024-01-01", 42)])
+
+    assert writer.status(job)["status"] == "journaled"
+    assert utils._read_journal(utils.DEFAULT_LINE)[-1]["rows"][0]["Output (pcs)"] == 42
+
+    # "Restart": proses baru memulihkan perubahan dari journal saat load_data
+    df = utils.load_data()
+    assert df["Output (pcs)"].tolist() == [42.0]
+
+def test_failed_apply_stays_journaled_and_is_retried(data_dir, monkeypatch):
+    monkeypatch.setattr(utils, "WRITE_RETRY_SECONDS", 0.05)
+    write_csv = utils._write_csv_atomic
+    utils._bootstrap_journal(utils.DEFAULT_LINE)
+
+    def disk_full(df, path):
+        raise OSError("disk full")
+    monkeypatch.setattr(utils, "_write_csv_atomic", disk_full)
+
+    writer = utils.BackgroundWriter()
+    job = writer.submit(FILTER, [stt_row("2024-01-01", 7)])
+    assert wait_for(lambda: writer.status(job)["error"] == "disk full")
+    assert writer.status(job)["status"] == "journaled"
+
+    monkeypatch.setattr(utils, "_write_csv_atomic", write_csv)
+    assert wait_for(lambda: writer.status(job)["status"] == "done")
+    assert utils.load_data()["Output (pcs)"].tolist() == [7.0]
@@ -1,72 +1,805 @@
 import pandas as pd
 import streamlit as st
 import os
+import json
+import datetime
+import queue
+import threading
+import uuid
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
+import column_store
+from schema import (
+    BERAT_PER_PCS_KG, STT_DUMMY_MESIN, COLUMNS, DISK_DTYPES, DEFAULT_LINE, LINES,
+    empty_frame, validate, validate_rows, from_disk, hash_keys
+)
+
 FILE_PATH = "data_produksi.csv"
 ESTIMASI_TOTAL_BARIS = 100000 
 
-# --- KONSTANTA GLOBAL ---
-BERAT_PER_PCS_KG = 0.075 
-STT_DUMMY_MESIN = "STT_DUMMY_OUTPUT" 
+# --- JOURNAL & SNAPSHOT ---
+# Setiap perubahan dari form input dicatat dulu ke journal (append-only),
+# baru kemudian diterapkan ke FILE_PATH. Snapshot berkala dipakai sebagai
+# titik awal replay untuk recovery dan untuk load_data(as_of=...).
+# Setiap kali snapshot dibuat, journal aktif diarsipkan ke SNAPSHOT_DIR
+# dan dimulai ulang dari snapshot tersebut, sehingga journal aktif hanya
+# berisi entri sejak snapshot terakhir. Arsip journal tidak pernah dihapus;
+# hanya snapshot lama hasil replay yang dijarangkan.
+JOURNAL_PATH = "data_produksi.journal.jsonl"
+CHECKPOINT_PATH = "data_produksi.checkpoint.json"
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_INTERVAL = 50 # Jumlah entri journal antar snapshot
+SNAPSHOT_RETENTION = 30 # Jumlah snapshot terbaru yang selalu disimpan
+SNAPSHOT_THIN_FACTOR = 20 # Snapshot yang lebih lama: satu per SNAPSHOT_INTERVAL * faktor ini entri
+JOURNAL_TAIL_BLOCK = 64 * 1024 # Ukuran blok saat membaca journal dari belakang
+
+# Baris yang ditolak validator saat migrasi data lama disimpan di sini
+REJECTED_PATH = "data_produksi.rejected.csv"
+
+# Salinan kolom memory-mapped untuk jalur baca (lihat column_store.py)
+STORE_DIR = "columns"
+
+# --- SHARD PER LINE ---
+# Line default memakai path di atas apa adanya; line lain menyimpan file
+# yang sama di SHARD_DIR/<line>/ sehingga tiap line punya data, journal,
+# checkpoint, dan snapshot sendiri.
+SHARD_DIR = "shards"
+
+# Semua penulisan data (background writer, recovery, bulk save) satu line
+# lewat lock line tersebut; line berbeda bisa ditulis bersamaan.
+# Penambahan entri ke journal memakai lock terpisah yang hanya dipegang
+# sebentar, agar form tidak menunggu penulisan ulang CSV yang sedang berjalan.
+# Urutan pengambilan lock selalu write lock -> journal lock.
+_WRITE_LOCKS = {}
+_JOURNAL_LOCKS = {}
+_WRITE_LOCKS_GUARD = threading.Lock()
 
-def load_data():
-    if not os.path.exists(FILE_PATH):
-        st.warning(f"File '{FILE_PATH}' belum ada. Membuat template data baru...")
-        df_dummy = pd.DataFrame(columns=[
-            "Tanggal", "Shift", "Mesin", "Varian", "Jenis Reject", 
-            "Jam 1", "Jam 2", "Jam 3", "Jam 4", "Jam 5", "Jam 6", "Jam 7", "Jam 8", 
-            "Koreksi", "Total Reject", "STT Waste (Kg)", "Output (pcs)"
-        ])
-        return df_dummy
+def _write_lock(line):
+    with _WRITE_LOCKS_GUARD:
+        return _WRITE_LOCKS.setdefault(line, threading.RLock())
 
+def _journal_lock(line):
+    with _WRITE_LOCKS_GUARD:
+        return _JOURNAL_LOCKS.setdefault(line, threading.RLock())
+
+def _shard_path(path, line):
+    """Path file untuk line tertentu. Direktori shard tidak dibuat di sini."""
+    if line == DEFAULT_LINE:
+        return path
+    return os.path.join(SHARD_DIR, line, path)
+
+def _ensure_shard_dir(line):
+    """Buat direktori shard; hanya dipanggil dari jalur tulis."""
+    if line != DEFAULT_LINE:
+        os.makedirs(os.path.join(SHARD_DIR, line), exist_ok=True)
+
+def _read_csv(path, progress=None, dtype=DISK_DTYPES):
+    """
+    Membaca CSV per chunk. Mengembalikan list chunk (bisa kosong).
+    Default-nya membaca dengan tipe skema karena data di disk sudah
+    tervalidasi; gunakan dtype=None untuk file lama yang belum divalidasi.
+    """
     chunks = []
     chunksize = 50000 
-    progress = st.progress(0, text="Membaca Database...")
     total_read = 0
 
-    try:
-        # Gunakan low_memory=False agar tipe data lebih konsisten
-        for chunk in pd.read_csv(FILE_PATH, chunksize=chunksize, engine='c', low_memory=False, encoding='utf-8'): 
-            total_read += len(chunk)
+    # Gunakan low_memory=False agar tipe data lebih konsisten
+    for chunk in pd.read_csv(path, chunksize=chunksize, engine='c', low_memory=False, encoding='utf-8', dtype=dtype): 
+        total_read += len(chunk)
+        if progress is not None:
             progress_value = min(total_read / ESTIMASI_TOTAL_BARIS, 1.0) 
             progress.progress(progress_value, text=f"Loading Data... {int(progress_value * 100)}%")
-            
-            # Bersihkan Tanggal dari spasi atau karakter non-visible
-            if 'Tanggal' in chunk.columns:
-                chunk['Tanggal'] = chunk['Tanggal'].astype(str).str.strip() 
+        chunks.append(chunk)
+
+    return chunks
+
+def _write_csv_atomic(df, path):
+    """Tulis ke file sementara lalu os.replace, agar file lama tidak pernah setengah tertulis."""
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path, index=False, encoding='utf-8')
+    with open(tmp_path, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _read_state(path):
+    """Membaca file data/snapshot utuh tanpa progress bar."""
+    if not os.path.exists(path):
+        return empty_frame()
+    chunks = _read_csv(path)
+    if not chunks:
+        return empty_frame()
+    return pd.concat(chunks, ignore_index=True)
+
+# ====================================================================
+# --- JOURNAL ---
+# ====================================================================
+
+def _read_journal(line):
+    """Membaca semua entri journal aktif (sejak snapshot terakhir)."""
+    return _read_journal_file(_shard_path(JOURNAL_PATH, line))
+
+def _read_journal_file(journal_path):
+    """
+    Membaca semua entri satu file journal. Baris yang tidak bisa di-parse
+    dilewati; sisa baris terpotong di akhir file dibuang oleh _repair_journal
+    sebelum ada entri baru yang ditambahkan.
+    """
+    if not os.path.exists(journal_path):
+        return []
+    entries = []
+    with open(journal_path, encoding='utf-8') as f:
+        for raw in f:
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                entries.append(json.loads(raw))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+def _journal_tail(line):
+    """
+    Dibaca dari belakang file tanpa mem-parse seluruh journal. Mengembalikan
+    (seq entri utuh terakhir, offset akhir bagian yang utuh, ukuran file);
+    seq -1 jika belum ada entri utuh.
+    """
+    journal_path = _shard_path(JOURNAL_PATH, line)
+    if not os.path.exists(journal_path):
+        return -1, 0, 0
+    with open(journal_path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        pos, buf = size, b""
+        while pos > 0:
+            step = min(JOURNAL_TAIL_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+            last_nl = buf.rfind(b"\n")
+            prev_nl = buf.rfind(b"\n", 0, last_nl) if last_nl > 0 else -1
+            if last_nl == -1 or (prev_nl == -1 and pos > 0):
+                continue
+            complete_end = pos + last_nl + 1
+            try:
+                return json.loads(buf[prev_nl + 1:last_nl])["seq"], complete_end, size
+            except (json.JSONDecodeError, KeyError):
+                # Baris rusak di tengah journal lama: cari seq lewat parse penuh
+                entries = _read_journal(line)
+                return max((e["seq"] for e in entries), default=-1), complete_end, size
+    return -1, 0, size
+
+def _repair_journal(line):
+    """
+    Buang baris terakhir yang terpotong (crash saat menulis) agar entri baru
+    tidak tersambung ke baris rusak. Mengembalikan seq entri utuh terakhir.
+    """
+    with _journal_lock(line):
+        seq, complete_end, size = _journal_tail(line)
+        if complete_end < size:
+            with open(_shard_path(JOURNAL_PATH, line), "r+b") as f:
+                f.truncate(complete_end)
+                os.fsync(f.fileno())
+        return seq
+
+def _journal_head(journal_path):
+    """Entri pertama sebuah file journal (titik awal segmen), atau None."""
+    try:
+        with open(journal_path, encoding='utf-8') as f:
+            return json.loads(f.readline())
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def _append_journal(entry, line):
+    with _journal_lock(line), open(_shard_path(JOURNAL_PATH, line), "a", encoding='utf-8') as f:
+        f.write(json.dumps(entry, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def _read_checkpoint(line):
+    """Seq journal terakhir yang sudah tercermin di FILE_PATH (-1 jika belum ada)."""
+    checkpoint_path = _shard_path(CHECKPOINT_PATH, line)
+    if not os.path.exists(checkpoint_path):
+        return -1
+    try:
+        with open(checkpoint_path, encoding='utf-8') as f:
+            return int(json.load(f)["seq"])
+    except (ValueError, KeyError, json.JSONDecodeError):
+        return -1
+
+def _write_checkpoint(seq, line):
+    checkpoint_path = _shard_path(CHECKPOINT_PATH, line)
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w", encoding='utf-8') as f:
+        json.dump({"seq": seq}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def _refresh_store(df, seq, line, key_hash=None):
+    """
+    Perbarui column store setelah data ditulis. Kunci baris sudah dijamin
+    unik oleh jalur tulis, jadi tidak ada deduplikasi di sini maupun saat dibaca.
+    """
+    column_store.write_store(df, _shard_path(STORE_DIR, line), seq, key_hash)
+
+def _key_index(df, line):
+    """
+    Hash NATURAL_KEY per baris `df` (data FILE_PATH saat ini). Dibaca dari
+    key_hash.npy di column store jika store sejajar dengan checkpoint;
+    selain itu dihitung ulang.
+    """
+    store_dir = _shard_path(STORE_DIR, line)
+    version = column_store.store_version(store_dir)
+    if version is not None and version == _read_checkpoint(line):
+        hashes = column_store.read_hashes(store_dir, version)
+        if hashes is not None and len(hashes[0]) == len(df):
+            return hashes[0]
+    return hash_keys(df)
+
+def _snapshot_path(seq, line):
+    return os.path.join(_shard_path(SNAPSHOT_DIR, line), f"snapshot_{seq:08d}.csv")
+
+def _segment_path(seq, line):
+    """Arsip journal yang dimulai dari snapshot `seq`."""
+    return os.path.join(_shard_path(SNAPSHOT_DIR, line), f"journal_{seq:08d}.jsonl")
+
+def _seq_from_name(name):
+    return int(name.split("_")[1].split(".")[0])
+
+def _write_snapshot(df, seq, line):
+    os.makedirs(_shard_path(SNAPSHOT_DIR, line), exist_ok=True)
+    _write_csv_atomic(df, _snapshot_path(seq, line))
+
+def _rotate_journal(seq, ts, line, derived=False):
+    """
+    Arsipkan entri journal aktif sampai `seq` lalu mulai journal baru dari
+    snapshot `seq` yang sudah ditulis dan sudah tercermin di checkpoint.
+    Entri sesudah `seq` yang sudah tercatat tapi belum diterapkan ikut
+    dipindah ke journal baru. Jika crash di tengah jalan, journal lama
+    tetap utuh dan diarsipkan ulang pada rotasi berikutnya.
+    `derived` menandai snapshot yang sama dengan hasil replay journal
+    sebelumnya (snapshot berkala), sehingga boleh dijarangkan nanti.
+    """
+    journal_path = _shard_path(JOURNAL_PATH, line)
+    with _journal_lock(line):
+        head = _journal_head(journal_path)
+        if head is not None and head["seq"] == seq:
+            return
+        archived, carried = [], []
+        if head is not None:
+            with open(journal_path, encoding='utf-8') as f:
+                for raw in f:
+                    try:
+                        entry_seq = json.loads(raw)["seq"]
+                    except (json.JSONDecodeError, KeyError):
+                        continue
+                    (archived if entry_seq <= seq else carried).append(raw)
+            archive_path = _segment_path(head["seq"], line)
+            with open(f"{archive_path}.tmp", "w", encoding='utf-8') as f:
+                f.writelines(archived)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(f"{archive_path}.tmp", archive_path)
+
+        tmp_path = f"{journal_path}.tmp"
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            f.write(json.dumps({"seq": seq, "ts": ts, "op": "reset", "derived": derived}) + "\n")
+            f.writelines(carried)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, journal_path)
+    _prune_snapshots(line)
+
+def _segment_paths(line):
+    """Semua segmen journal berurutan: arsip di SNAPSHOT_DIR lalu journal aktif."""
+    snapshot_dir = _shard_path(SNAPSHOT_DIR, line)
+    paths = sorted(
+        os.path.join(snapshot_dir, name) for name in os.listdir(snapshot_dir)
+        if name.startswith("journal_") and name.endswith(".jsonl")
+    ) if os.path.isdir(snapshot_dir) else []
+    return paths + [_shard_path(JOURNAL_PATH, line)]
+
+def _prune_snapshots(line):
+    """
+    Jarangkan snapshot berkala yang lama: SNAPSHOT_RETENTION snapshot terbaru
+    disimpan, yang lebih lama disisakan satu per SNAPSHOT_INTERVAL *
+    SNAPSHOT_THIN_FACTOR entri. Snapshot dari bulk edit/bootstrap (tidak bisa
+    direplay dari journal) dan semua arsip journal selalu disimpan, sehingga
+    setiap titik waktu tetap bisa direkonstruksi dari snapshot sebelumnya.
+    """
+    heads = [_journal_head(path) for path in _segment_paths(line)]
+    derived = sorted(head["seq"] for head in heads if head is not None and head.get("derived"))
+    existing = [seq for seq in derived if os.path.exists(_snapshot_path(seq, line))]
+    kept_buckets = set()
+    for seq in existing[:-SNAPSHOT_RETENTION]:
+        bucket = seq // (SNAPSHOT_INTERVAL * SNAPSHOT_THIN_FACTOR)
+        if bucket in kept_buckets:
+            os.remove(_snapshot_path(seq, line))
+        kept_buckets.add(bucket)
+
+def match_filter(df, filter_spec):
+    """
+    Mask numpy dari filter_spec {kolom: nilai atau list nilai}. Dipakai oleh
+    replay journal maupun tampilan optimistik di halaman input, agar keduanya
+    selalu sepakat baris mana yang diganti. Nilai dibandingkan sebagai string
+    yang di-strip (seperti normalisasi di schema.validate), sehingga Tanggal
+    string dari CSV dan datetime.date dari form tetap cocok. Yang dikonversi
+    ke string hanya nilai unik per kolom (kamus kategori, atau hasil
+    factorize), bukan setiap baris.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for col, value in filter_spec.items():
+        if col not in df.columns:
+            return np.zeros(len(df), dtype=bool)
+        values = {str(v).strip() for v in (value if isinstance(value, list) else [value])}
+        column = df[col]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Hasil query kecil tetap membawa seluruh kamus (mis. semua Tanggal)
+            if len(column) < len(column.cat.categories):
+                column = column.cat.remove_unused_categories()
+            codes, uniques = column.cat.codes.to_numpy(), column.cat.categories
+        else:
+            codes, uniques = pd.factorize(column)
+        # Kode -1 (NaN) menunjuk ke elemen False terakhir
+        hit = np.array([str(u).strip() in values for u in uniques] + [False], dtype=bool)
+        mask &= hit[codes]
+    return mask
+
+def _apply_entry(df, keys, entry, line):
+    """
+    Menerapkan satu entri journal ke dataframe. `keys` adalah hash kunci
+    per baris `df` (None: dihitung saat dibutuhkan) dan diperbarui bersama
+    dataframe, sehingga entri berikutnya tidak perlu meng-hash ulang semua baris.
+    Mengembalikan (df, keys).
+    """
+    if entry["op"] == "reset":
+        snapshot_path = _snapshot_path(entry["seq"], line)
+        # Snapshot berkala yang sudah dijarangkan sama dengan hasil replay sebelumnya
+        if entry.get("derived") and not os.path.exists(snapshot_path):
+            return df, keys
+        return _read_state(snapshot_path), None
+
+    # op "replace": hapus baris yang cocok dengan filter, lalu tambahkan baris baru
+    df_rows = pd.DataFrame(entry["rows"], columns=COLUMNS)
+    mask = match_filter(df, entry["filter"])
+    if df_rows.empty:
+        return df[~mask].reset_index(drop=True), None if keys is None else keys[~mask]
+
+    # Upsert lewat hash kunci: baris lama dengan kunci yang sama selalu
+    # diganti, sehingga NATURAL_KEY tetap unik tanpa dedup saat dibaca
+    if keys is None:
+        keys = hash_keys(df)
+    row_keys = hash_keys(df_rows)
+    mask |= np.isin(keys, row_keys)
+    df = pd.concat([df[~mask], df_rows], ignore_index=True)
+    return df, np.concatenate([keys[~mask], row_keys])
+
+def _now():
+    return datetime.datetime.now().isoformat()
+
+def _next_seq(line):
+    """Seq untuk entri berikutnya; tidak pernah mengulang seq yang sudah dipakai."""
+    return max(_journal_tail(line)[0], _read_checkpoint(line)) + 1
+
+def _bootstrap_journal(line):
+    """
+    Jika journal belum berisi entri, data saat ini dijadikan snapshot dasar
+    sehingga semua entri berikutnya punya titik awal untuk di-replay.
+    Data lama divalidasi sekali di sini; baris yang ditolak dipindah ke
+    REJECTED_PATH agar bisa diperiksa.
+    """
+    with _write_lock(line):
+        if _repair_journal(line) >= 0:
+            return
+
+        _ensure_shard_dir(line)
+        file_path = _shard_path(FILE_PATH, line)
+        df_base = empty_frame()
+        if os.path.exists(file_path):
+            chunks = _read_csv(file_path, dtype=None)
+            if chunks:
+                df_base, df_invalid = validate(pd.concat(chunks, ignore_index=True), line)
+                if not df_invalid.empty:
+                    df_invalid.to_csv(_shard_path(REJECTED_PATH, line), index=False, encoding='utf-8')
+        seq = _read_checkpoint(line) + 1
+        _write_csv_atomic(df_base, file_path)
+        _write_snapshot(df_base, seq, line)
+        _append_journal({"seq": seq, "ts": _now(), "op": "reset"}, line)
+        _write_checkpoint(seq, line)
+        _refresh_store(df_base, seq, line)
+
+def recover_data(line=DEFAULT_LINE):
+    """
+    Terapkan entri journal yang belum tercermin di FILE_PATH: entri dari
+    form yang baru dicatat, atau sisa crash di tengah penulisan. Aman
+    dipanggil berkali-kali: setiap entri bersifat idempoten. Jika journal
+    utuh dan checkpoint tidak tertinggal, cukup satu pembacaan ekor journal
+    tanpa lock.
+    """
+    seq, complete_end, size = _journal_tail(line)
+    if seq <= _read_checkpoint(line) and complete_end == size:
+        return False
+
+    with _write_lock(line):
+        seq = _repair_journal(line)
+        checkpoint = _read_checkpoint(line)
+        if seq <= checkpoint:
+            return False
+
+        pending = [e for e in _read_journal(line) if e["seq"] > checkpoint]
+        file_path = _shard_path(FILE_PATH, line)
+        df = _read_state(file_path)
+        keys = _key_index(df, line)
+        for entry in pending:
+            df, keys = _apply_entry(df, keys, entry, line)
+        last = pending[-1]
+        _write_csv_atomic(df, file_path)
+        _write_checkpoint(last["seq"], line)
+        _refresh_store(df, last["seq"], line, keys)
+        if last["seq"] // SNAPSHOT_INTERVAL > checkpoint // SNAPSHOT_INTERVAL:
+            _write_snapshot(df, last["seq"], line)
+            _rotate_journal(last["seq"], last["ts"], line, derived=True)
+        return True
 
-            chunks.append(chunk)
+def data_version(line=DEFAULT_LINE):
+    """Seq journal terakhir yang sudah tersimpan; bisa dipakai sebagai kunci cache."""
+    return _read_checkpoint(line)
 
+def diff_data(old_version, new_version, line=DEFAULT_LINE):
+    """
+    Kunci baris yang berubah di antara dua versi data (lihat
+    column_store.diff_versions). None berarti salah satu versi sudah tidak
+    disimpan dan pemanggil perlu menghitung ulang penuh.
+    """
+    return column_store.diff_versions(_shard_path(STORE_DIR, line), old_version, new_version)
+
+def _load_as_of(as_of, line):
+    """
+    Merekonstruksi data pada waktu `as_of`: replay journal dari snapshot
+    terakhir yang masih ada sebelum `as_of`. Hanya segmen journal antara
+    snapshot tersebut dan `as_of` yang di-parse.
+    """
+    as_of = pd.Timestamp(as_of)
+    segments = [(path, _journal_head(path)) for path in _segment_paths(line)]
+    segments = [(path, head) for path, head in segments if head is not None]
+    target = max((idx for idx, (_, head) in enumerate(segments) if pd.Timestamp(head["ts"]) <= as_of), default=None)
+    if target is None:
+        return empty_frame()
+
+    # Mundur ke segmen terdekat yang snapshot awalnya masih ada
+    start = target
+    while start > 0 and not os.path.exists(_snapshot_path(segments[start][1]["seq"], line)):
+        start -= 1
+
+    entries = [
+        e for path, _ in segments[start:target + 1] for e in _read_journal_file(path)
+        if pd.Timestamp(e["ts"]) <= as_of
+    ]
+
+    # Snapshot terakhir yang masih ada sebelum as_of menjadi titik awal
+    base_idx = 0
+    for idx, entry in enumerate(entries):
+        if os.path.exists(_snapshot_path(entry["seq"], line)):
+            base_idx = idx
+
+    df, keys = _read_state(_snapshot_path(entries[base_idx]["seq"], line)), None
+    for entry in entries[base_idx + 1:]:
+        df, keys = _apply_entry(df, keys, entry, line)
+    return df
+
+def _journal_changes(changes, line=DEFAULT_LINE):
+    """
+    Catat sekumpulan perubahan (filter_spec, rows) ke journal dan fsync;
+    setelah fungsi ini kembali, perubahan sudah tahan crash dan akan
+    diterapkan oleh recover_data. Hanya memegang journal lock, jadi tidak
+    menunggu penulisan ulang CSV yang sedang berjalan.
+    Mengembalikan list seq; SchemaError dilempar sebelum ada entri yang dicatat.
+    """
+    changes = [(filter_spec, validate_rows(rows, line)) for filter_spec, rows in changes]
+    if _journal_tail(line)[0] < 0:
+        _bootstrap_journal(line)
+
+    seqs = []
+    with _journal_lock(line):
+        _repair_journal(line)
+        seq = _next_seq(line)
+        for filter_spec, rows in changes:
+            # Snapshot lama dengan seq yang sama (sisa crash) tidak boleh dipakai lagi
+            if os.path.exists(_snapshot_path(seq, line)):
+                os.remove(_snapshot_path(seq, line))
+            _append_journal({"seq": seq, "ts": _now(), "op": "replace", "filter": filter_spec, "rows": rows}, line)
+            seqs.append(seq)
+            seq += 1
+    return seqs
+
+def _apply_changes(changes, line=DEFAULT_LINE):
+    """
+    Versi sinkron: catat perubahan ke journal lalu langsung terapkan.
+    Mengembalikan seq entri terakhir. Jika penerapan gagal, exception
+    diteruskan tetapi perubahan tetap tercatat dan diterapkan pada
+    recover_data berikutnya.
+    """
+    seqs = _journal_changes(changes, line)
+    recover_data(line)
+    return seqs[-1]
+
+# ====================================================================
+# --- BACKGROUND WRITER ---
+# ====================================================================
+
+# Status job yang sudah diterapkan dihapus setelah selang waktu ini
+WRITE_STATUS_TTL = datetime.timedelta(minutes=30)
+# Jeda sebelum mencoba ulang penerapan yang gagal
+WRITE_RETRY_SECONDS = 5
+
+class BackgroundWriter:
+    """
+    Perubahan dari form dicatat ke journal (fsync) saat submit, lalu
+    diterapkan ke CSV/store di thread terpisah agar form tidak menunggu
+    siklus baca-ubah-tulis CSV. Perubahan yang menumpuk digabung menjadi
+    satu kali penulisan per line.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._status = {}
+        self._status_lock = threading.Lock()
+        self._retry_lines = set()
+        self._thread = threading.Thread(target=self._run, name="data-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, filter_spec, rows, line=DEFAULT_LINE):
+        """
+        Catat perubahan ke journal dan kembalikan job id-nya. SchemaError dan
+        error saat menulis journal langsung sampai ke form: perubahan tidak
+        tersimpan. Jika submit berhasil, perubahan tidak akan hilang walau
+        proses mati sebelum diterapkan.
+        """
+        seq = _journal_changes([(filter_spec, rows)], line)[-1]
+        job_id = uuid.uuid4().hex
+        with self._status_lock:
+            self._prune_status()
+            self._status[job_id] = {"status": "journaled", "line": line, "seq": seq, "error": None, "done_at": None}
+        self._queue.put(line)
+        return job_id
+
+    def status(self, job_id):
+        """
+        Status job: dict berisi status, error, done_at. "journaled" berarti
+        sudah aman di journal tapi belum diterapkan (error berisi alasan jika
+        penerapan gagal dan akan dicoba ulang); "done" berarti sudah diterapkan.
+        "unknown" jika job tidak dikenal writer ini (sudah dihapus atau writer dibuat ulang).
+        """
+        with self._status_lock:
+            return dict(self._status.get(job_id, {"status": "unknown", "error": None, "done_at": None}))
+
+    def _prune_status(self):
+        """Hapus status job selesai yang lebih lama dari WRITE_STATUS_TTL. Dipanggil dengan _status_lock."""
+        expired_before = datetime.datetime.now() - WRITE_STATUS_TTL
+        for job_id in [job_id for job_id, s in self._status.items()
+                       if s["done_at"] is not None and s["done_at"] < expired_before]:
+            del self._status[job_id]
+
+    def _run(self):
+        while True:
+            timeout = WRITE_RETRY_SECONDS if self._retry_lines else None
+            lines = set(self._retry_lines)
+            try:
+                lines.add(self._queue.get(timeout=timeout))
+                while True:
+                    lines.add(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            # Satu kali penulisan per line, mencakup semua entri yang sudah dicatat
+            for line in lines:
+                try:
+                    recover_data(line)
+                    error = None
+                    self._retry_lines.discard(line)
+                except Exception as e:
+                    error = str(e)
+                    self._retry_lines.add(line)
+
+                version = data_version(line)
+                done_at = datetime.datetime.now()
+                with self._status_lock:
+                    for status in self._status.values():
+                        if status["line"] != line or status["status"] != "journaled":
+                            continue
+                        if status["seq"] <= version:
+                            status.update(status="done", error=None, done_at=done_at)
+                        else:
+                            status["error"] = error
+
+@st.cache_resource
+def get_writer():
+    """Satu writer per proses, dipakai bersama oleh semua sesi."""
+    return BackgroundWriter()
+
+def submit_change(filter_spec, rows, line=DEFAULT_LINE):
+    """
+    Simpan perubahan dari form input: baris yang cocok dengan `filter_spec`
+    diganti dengan `rows`. Perubahan dicatat ke journal sebelum fungsi ini
+    kembali; penerapan ke data berjalan di background. Mengembalikan job id.
+    """
+    return get_writer().submit(filter_spec, rows, line)
+
+def get_write_status(job_id):
+    return get_writer().status(job_id)
+
+# ====================================================================
+# --- LOAD & SAVE ---
+# ====================================================================
+
+def _read_shard(line, progress=None):
+    """
+    Membaca data satu line dari column store (memory-mapped, tanpa salinan).
+    Jika store belum ada atau tertinggal dari checkpoint, store dibangun
+    ulang sekali dari CSV.
+    """
+    store_dir = _shard_path(STORE_DIR, line)
+    if column_store.store_version(store_dir) != data_version(line):
+        with _write_lock(line):
+            version = data_version(line)
+            if column_store.store_version(store_dir) != version:
+                file_path = _shard_path(FILE_PATH, line)
+                chunks = _read_csv(file_path, progress) if os.path.exists(file_path) else []
+                df = pd.concat(chunks, ignore_index=True) if chunks else empty_frame()
+                _refresh_store(df, version, line)
+    return column_store.read_store(store_dir)
+
+def load_data(as_of=None, line=DEFAULT_LINE):
+    """
+    Memuat data produksi satu line. Jika `as_of` diisi (datetime/string),
+    data direkonstruksi sesuai kondisi pada waktu tersebut dari journal.
+    Data di disk sudah tervalidasi saat ditulis; halaman tidak perlu
+    membersihkan ulang. Data terkini dibaca dari column store yang
+    memory-mapped dan read-only: gunakan df.copy() sebelum mengubah isinya.
+    """
+    if as_of is not None:
+        try:
+            return from_disk(_load_as_of(as_of, line))
+        except Exception as e:
+            st.error(f"Error saat merekonstruksi data: {e}")
+            return from_disk(empty_frame())
+
+    try:
+        if recover_data(line):
+            st.info("Perubahan yang belum tersimpan berhasil dipulihkan dari journal.")
+
+        # Migrasi sekali: data lama divalidasi sebelum dianggap terpercaya
+        if not os.path.exists(_shard_path(JOURNAL_PATH, line)):
+            _bootstrap_journal(line)
+            rejected_path = _shard_path(REJECTED_PATH, line)
+            if os.path.exists(rejected_path):
+                st.warning(f"Sebagian baris data lama tidak valid dan dipindahkan ke '{rejected_path}'.")
+    except Exception as e:
+        st.error(f"Error saat recovery journal: {e}")
+
+    progress = st.progress(0, text="Membaca Database...")
+
+    try:
+        df = _read_shard(line, progress)
         progress.empty() # Hapus progress bar setelah selesai
-        
-        if not chunks:
-            return pd.DataFrame()
-
-        df = pd.concat(chunks, ignore_index=True)
-        
-        # Bersihkan baris yang benar-benar kosong
-        df.dropna(how='all', inplace=True)
-        
-        # Hapus duplikasi berdasarkan baris yang identik
-        df = df.drop_duplicates()
-        
         return df
 
     except Exception as e:
         st.error(f"Error saat memuat data: {e}")
-        return pd.DataFrame()
+        return from_disk(empty_frame())
 
-def save_data(df, message="Data Berhasil Disimpan"):
+def save_data(df, message="Data Berhasil Disimpan", line=DEFAULT_LINE):
+    """
+    Menimpa seluruh data (bulk edit / import). Data baru disimpan sebagai
+    snapshot dan dicatat sebagai entri "reset" di journal agar histori
+    sebelumnya tetap bisa direkonstruksi. Seluruh baris harus lolos validasi.
+    """
     try:
-        # Simpan dengan format yang bersih
-        df.to_csv(FILE_PATH, index=False, encoding='utf-8')
+        df, df_invalid = validate(df, line)
+        if not df_invalid.empty:
+            st.error(f"{len(df_invalid)} baris tidak valid, data tidak disimpan: "
+                     f"{'; '.join(df_invalid['Alasan'].unique())}")
+            return False
+
+        with _write_lock(line):
+            recover_data(line)
+            _bootstrap_journal(line)
+            with _journal_lock(line):
+                seq = _next_seq(line)
+                entry = {"seq": seq, "ts": _now(), "op": "reset"}
+                _write_snapshot(df, seq, line)
+                _append_journal(entry, line)
+
+            # Simpan dengan format yang bersih
+            _write_csv_atomic(df, _shard_path(FILE_PATH, line))
+            _write_checkpoint(seq, line)
+            _refresh_store(df, seq, line)
+            _rotate_journal(seq, entry["ts"], line)
         st.toast(message, icon='💾')
         return True
     except Exception as e:
         st.error(f"Gagal menyimpan data ke CSV: {e}")
         return False
 
+# ====================================================================
+# --- ROLLUP LINTAS PLANT ---
+# ====================================================================
+
+# Pre-agregat per shard disimpan bersama versi datanya, sehingga shard yang
+# tidak berubah tidak dibaca ulang saat rollup dihitung lagi
+_AGG_CACHE = {}
+_AGG_CACHE_LOCK = threading.Lock()
+
+def aggregate_shard(df):
+    """Pre-agregat satu shard per Tanggal & Shift: Output, STT Waste, dan Reject Detail."""
+    is_dummy = df["Jenis Reject"] == STT_DUMMY_MESIN
+    df_agg = pd.DataFrame({
+        "Tanggal": df["Tanggal"],
+        "Shift": df["Shift"],
+        "Output (pcs)": df["Output (pcs)"].where(is_dummy, 0.0),
+        "STT Waste (Kg)": df["STT Waste (Kg)"].where(is_dummy, 0.0),
+        "Total Reject": df["Total Reject"].where(~is_dummy, 0.0),
+    })
+    df_agg = df_agg.groupby(["Tanggal", "Shift"], as_index=False, observed=True).sum()
+    # Hasil agregat kecil: Tanggal/Shift dijadikan nilai biasa agar bisa digabung antar shard
+    df_agg["Tanggal"] = df_agg["Tanggal"].astype(object)
+    df_agg["Shift"] = df_agg["Shift"].astype(str)
+    return df_agg
+
+def _shard_aggregate(line):
+    """
+    Pre-agregat satu shard dari versi column store yang aktif. Jalur baca
+    murni: tanpa lock, recovery, atau bootstrap. Versi store tidak pernah
+    diubah setelah ditulis dan dipindah secara atomik lewat CURRENT, jadi
+    versi yang dibaca di sini selalu utuh.
+    """
+    store_dir = _shard_path(STORE_DIR, line)
+    version = column_store.store_version(store_dir)
+    if version is None:
+        return aggregate_shard(from_disk(empty_frame()))
+
+    with _AGG_CACHE_LOCK:
+        cached = _AGG_CACHE.get(line)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    df_shard = column_store.read_store(store_dir, version)
+    df_diff = diff_data(cached[0], version, line) if cached is not None else None
+    if df_diff is None:
+        df_agg = aggregate_shard(df_shard)
+    else:
+        # Hanya tanggal yang kuncinya berubah yang dihitung ulang
+        changed_dates = set(df_diff["Tanggal"])
+        df_agg = pd.concat([
+            cached[1][~cached[1]["Tanggal"].isin(changed_dates)],
+            aggregate_shard(df_shard[df_shard["Tanggal"].isin(changed_dates)]),
+        ], ignore_index=True)
+
+    # Pembaca paralel bisa selesai tidak berurutan: jangan timpa versi yang lebih baru
+    with _AGG_CACHE_LOCK:
+        current = _AGG_CACHE.get(line)
+        if current is None or current[0] < version:
+            _AGG_CACHE[line] = (version, df_agg)
+    return df_agg
+
+def load_rollup(lines=None):
+    """
+    Agregat lintas plant/line per Tanggal & Shift. Setiap shard dibaca dan
+    diagregasi secara paralel; yang digabung hanya pre-agregatnya, bukan
+    data mentah.
+    """
+    lines = list(lines or LINES)
+    with ThreadPoolExecutor(max_workers=len(lines)) as executor:
+        aggs = list(executor.map(_shard_aggregate, lines))
+
+    frames = [
+        df_agg.assign(Plant=LINES[line]["plant"], Line=LINES[line]["nama"])
+        for line, df_agg in zip(lines, aggs)
+    ]
+    return pd.concat(frames, ignore_index=True)[
+        ["Plant", "Line", "Tanggal", "Shift", "Output (pcs)", "STT Waste (Kg)", "Total Reject"]
+    ]
+
 def get_summary_data(df):
     """
     Menghitung metrik ringkasan harian (per Tanggal & Shift) untuk Laporan.
@@ -74,27 +807,21 @@ def get_summary_data(df):
     if df is None or df.empty:
         return pd.DataFrame()
 
-    # Copy data agar tidak merusak dataframe asli
-    df_valid = df.copy()
-    
-    # Pastikan kolom numerik benar-benar angka
-    cols_to_fix = ["Output (pcs)", "STT Waste (Kg)", "Total Reject"]
-    for col in cols_to_fix:
-        if col in df_valid.columns:
-            df_valid[col] = pd.to_numeric(df_valid[col], errors='coerce').fillna(0)
+    # Data dari load_data sudah bertipe sesuai skema
+    df_valid = df
 
     # Pisahkan data Output (Dummy Mesin) dan Reject Detail (Input Operator)
     df_output = df_valid[df_valid["Jenis Reject"] == STT_DUMMY_MESIN].copy()
     df_reject_detail = df_valid[df_valid["Jenis Reject"] != STT_DUMMY_MESIN].copy()
     
     # Agregasi Output & Waste Audit
-    output_agg = df_output.groupby(["Tanggal", "Shift"]).agg(
+    output_agg = df_output.groupby(["Tanggal", "Shift"], observed=True).agg(
         Output_pcs=('Output (pcs)', 'sum'),
         STT_Waste_Audit=('STT Waste (Kg)', 'sum')
     ).reset_index()
     
     # Agregasi Reject Detail (dari operator)
-    reject_agg = df_reject_detail.groupby(["Tanggal", "Shift"]).agg(
+    reject_agg = df_reject_detail.groupby(["Tanggal", "Shift"], observed=True).agg(
         Total_Reject_Detail=('Total Reject', 'sum')
     ).reset_index()
     